@@ -4,9 +4,11 @@ import logging
 import os
 import signal
 import sys
+import threading
 import time
 import sqlite3
 
+from dataclasses import dataclass
 from typing import Optional
 
 from meshtastic.serial_interface import SerialInterface
@@ -14,10 +16,151 @@ from pubsub import pub
 
 from rxonly.config import Config
 from rxonly.db import Storage
+from rxonly.util import node_num_to_hex_id
 
 
 LOG_FORMAT = "[%(levelname)s] %(message)s"
 
+# Seconds between commits of queued writes in the main loop
+FLUSH_INTERVAL = 0.5
+
+
+
+
+def _normalize_telemetry(decoded: dict, normalized: dict, from_node_id: str) -> None:
+  metrics = decoded.get("telemetry", {}).get("deviceMetrics", {})
+  normalized["deviceMetrics"] = {
+    "batteryLevel": metrics.get("batteryLevel"),
+    "voltage": metrics.get("voltage"),
+  }
+
+
+
+
+def _normalize_position(decoded: dict, normalized: dict, from_node_id: str) -> None:
+  pos = decoded.get("position", {})
+  normalized["position"] = {
+    "latitude": pos.get("latitude"),
+    "longitude": pos.get("longitude"),
+    "altitude": pos.get("altitude"),
+  }
+
+
+
+
+def _normalize_nodeinfo(decoded: dict, normalized: dict, from_node_id: str) -> None:
+  user = decoded.get("user", {})
+  normalized["user"] = {
+    "id": user.get("id") or from_node_id,
+    "longName": user.get("longName"),
+    "shortName": user.get("shortName"),
+    "hwModel": user.get("hwModel"),
+    "role": user.get("role"),
+  }
+
+
+
+
+# Per-portnum functions that fill `normalized` from a decoded packet in place
+_PORT_NORMALIZERS = {
+  "TELEMETRY_APP": _normalize_telemetry,
+  "POSITION_APP": _normalize_position,
+  "NODEINFO_APP": _normalize_nodeinfo,
+}
+
+
+
+
+def _has_identity(user_data: dict) -> bool:
+  """Whether node user data carries anything worth creating a node record for."""
+  return bool(
+    user_data.get("longName")
+    or user_data.get("shortName")
+    or user_data.get("hwModel")
+    or user_data.get("role")
+    or user_data.get("publicKey")
+  )
+
+
+
+
+def _node_fields(node_data: dict) -> dict:
+  """
+  Map node data onto nodes table columns.
+  Unknown fields stay None; the upsert's COALESCE keeps existing values.
+  """
+  user_data = node_data.get("user", {})
+  device_metrics = node_data.get("deviceMetrics", {})
+  position = node_data.get("position", {})
+
+  return {
+    "short_name": user_data.get("shortName"),
+    "long_name": user_data.get("longName"),
+    "hardware": user_data.get("hwModel"),
+    "role": user_data.get("role"),
+    "snr": node_data.get("snr"),
+    "rssi": node_data.get("rssi"),
+    "battery_level": device_metrics.get("batteryLevel"),
+    "voltage": device_metrics.get("voltage"),
+    "latitude": position.get("latitude"),
+    "longitude": position.get("longitude"),
+    "altitude": position.get("altitude"),
+  }
+
+
+
+
+@dataclass(frozen=True, slots=True)
+class _Packet:
+  """Packet fields the collector uses, pulled out of the raw packet dict once."""
+  from_node_id: Optional[str]
+  message_id: int
+  to_id: Optional[str]
+  channel: int
+  rx_time: int
+  snr: Optional[float]
+  rssi: Optional[int]
+  hop_count: Optional[int]
+  reply_to: Optional[int]
+  via_mqtt: bool
+  text: Optional[str]
+
+
+
+
+def _canon_packet(packet: dict, decoded: dict) -> _Packet:
+  """Extract the fields used downstream from a Meshtastic packet."""
+  from_node_id = packet.get("fromId")
+  if not from_node_id:
+    raw_from = packet.get("from")
+    if raw_from:
+      from_node_id = node_num_to_hex_id(raw_from)
+
+  hop_start = packet.get("hopStart")
+  hop_limit = packet.get("hopLimit")
+
+  # Fall back only on a missing value; 0.0 dB SNR / 0 RSSI are real readings
+  snr = packet.get("rxSnr")
+  if snr is None:
+    snr = packet.get("snr")
+  rssi = packet.get("rxRssi")
+  if rssi is None:
+    rssi = packet.get("rx_rssi")
+
+  return _Packet(
+    from_node_id=from_node_id,
+    message_id=packet.get("id", 0),
+    to_id=packet.get("toId"),
+    channel=packet.get("channel", 0),
+    rx_time=packet.get("rxTime") or int(time.time()),
+    snr=snr,
+    rssi=rssi,
+    hop_count=(hop_start - hop_limit) if hop_start and hop_limit else None,
+    reply_to=decoded.get("replyId"),
+    via_mqtt=packet.get("viaMqtt", False),
+    text=decoded.get("text"),
+  )
+
 
 
 
@@ -32,7 +175,19 @@ class MeshtasticCollector:
     self.serial_port: str = Config.get("SERIAL_PORT")
     self.interface: Optional[SerialInterface] = None
     self._running = False
+    self._stop_event = threading.Event()
     self.local_node_id: Optional[str] = None
+    self._local_hex_id: Optional[str] = None
+
+    # Config is fixed once loaded; cache values read on every packet
+    self._log_dm: bool = bool(Config.get("LOG_DIRECT_MESSAGES"))
+    self._primary_channel: int = Config.get("PRIMARY_CHANNEL", 0)
+
+    # Channels tracked: PRIMARY_CHANNEL if LOG_PRIMARY_CHANNEL=True, plus any in LOG_CHANNEL_IDS
+    tracked_indexes = set(Config.get("LOG_CHANNEL_IDS") or [])
+    if Config.get("LOG_PRIMARY_CHANNEL", True):
+      tracked_indexes.add(self._primary_channel)
+    self._tracked_channels: frozenset[int] = frozenset(tracked_indexes)
 
 
 
@@ -46,6 +201,7 @@ class MeshtasticCollector:
     self._initial_node_sync()
 
     self.local_node_id = str(self.interface.localNode.nodeNum)
+    self._local_hex_id = node_num_to_hex_id(int(self.local_node_id))
     stored_node_id = self.storage.get_meta("local_node_id")
 
     if stored_node_id != self.local_node_id:
@@ -57,21 +213,30 @@ class MeshtasticCollector:
       self.storage.set_meta("local_node_id", self.local_node_id)
       self._restart_process()
 
-    self.storage.set_meta("local_node_id", self.local_node_id)
     self.storage.prune_stale_nodes()
 
     pub.subscribe(self._on_receive, "meshtastic.receive")
     pub.subscribe(self._on_node_update, "meshtastic.node.updated")
 
     self._running = True
-    self._main_loop()
+    try:
+      self._main_loop()
+    finally:
+      self._shutdown()
 
 
 
 
   def stop(self) -> None:
+    """Ask the main loop to exit; it closes the interface and storage on its way out."""
     logging.info("Stopping collector")
     self._running = False
+    self._stop_event.set()
+
+
+
+
+  def _shutdown(self) -> None:
     if self.interface:
       self.interface.close()
     self.storage.close()
@@ -80,8 +245,12 @@ class MeshtasticCollector:
 
 
   def _main_loop(self) -> None:
-    while self._running:
-      time.sleep(1)
+    # Each wakeup commits queued writes; stop() sets the event to exit promptly
+    while not self._stop_event.wait(FLUSH_INTERVAL):
+      try:
+        self.storage.flush()
+      except Exception:
+        logging.exception("Failed to flush queued messages")
 
 
 
@@ -98,11 +267,8 @@ class MeshtasticCollector:
     if not decoded:
       return
 
-    from_node_id = packet.get("fromId")
-    if not from_node_id:
-      raw_from = packet.get("from")
-      if raw_from:
-        from_node_id = f"!{raw_from & 0xFFFFFFFF:08x}"
+    pkt = _canon_packet(packet, decoded)
+    from_node_id = pkt.from_node_id
 
     if not from_node_id:
       logging.debug("Packet without node_id; skipping")
@@ -111,15 +277,14 @@ class MeshtasticCollector:
     portnum = decoded.get("portnum")
 
     # TEXT_MESSAGE_APP may not always have a reliable portnum
-    text = decoded.get("text")
-    if text:
+    if pkt.text:
       # Ensure the sender has a node record before storing the message.
       # If the node isn't in our DB yet, pull their identity from the
       # meshtastic interface's node cache (populated from prior NODEINFO_APP
       # packets received by the device, even ones we never saw directly).
-      if not self.storage.get_node(from_node_id):
+      if self.storage.get_node(from_node_id) is None:
         self._seed_node_from_interface(from_node_id)
-      self._handle_text_message(packet, from_node_id)
+      self._handle_text_message(pkt)
       return
 
     try:
@@ -128,7 +293,11 @@ class MeshtasticCollector:
       logging.debug("Database unavailable during packet processing: %s", e)
       raise
 
-    if not existing and portnum not in ("NODEINFO_APP", "TEXT_MESSAGE_APP"):
+    if portnum == "TEXT_MESSAGE_APP":
+      self._handle_text_message(pkt)
+      return
+
+    if existing is None and portnum != "NODEINFO_APP":
       logging.debug("Skip: %s (unknown node, waiting for NODEINFO)", from_node_id)
       return
 
@@ -136,39 +305,14 @@ class MeshtasticCollector:
     normalized = {
       "user": {"id": from_node_id},
       "decoded": decoded,
-      "snr": packet.get("rxSnr") or packet.get("snr"),
-      "rssi": packet.get("rxRssi") or packet.get("rx_rssi"),
+      "snr": pkt.snr,
+      "rssi": pkt.rssi,
       "_source": "packet",
     }
 
-    if portnum == "TELEMETRY_APP":
-      metrics = decoded.get("telemetry", {}).get("deviceMetrics", {})
-      normalized["deviceMetrics"] = {
-        "batteryLevel": metrics.get("batteryLevel"),
-        "voltage": metrics.get("voltage"),
-      }
-
-    elif portnum == "POSITION_APP":
-      pos = decoded.get("position", {})
-      normalized["position"] = {
-        "latitude": pos.get("latitude"),
-        "longitude": pos.get("longitude"),
-        "altitude": pos.get("altitude"),
-      }
-
-    elif portnum == "NODEINFO_APP":
-      user = decoded.get("user", {})
-      normalized["user"] = {
-        "id": user.get("id") or from_node_id,
-        "longName": user.get("longName"),
-        "shortName": user.get("shortName"),
-        "hwModel": user.get("hwModel"),
-        "role": user.get("role"),
-      }
-
-    elif portnum == "TEXT_MESSAGE_APP":
-      self._handle_text_message(packet, from_node_id)
-      return
+    normalizer = _PORT_NORMALIZERS.get(portnum)
+    if normalizer:
+      normalizer(decoded, normalized, from_node_id)
 
     self._on_node_update(normalized)
 
@@ -183,13 +327,30 @@ class MeshtasticCollector:
 
     logging.info("Starting initial node sync for %d nodes", len(self.interface.nodes))
 
+    known_ids = self.storage.get_node_ids()
+    last_seen = int(time.time())
+    nodes = []
+
     for node_id, node in self.interface.nodes.items():
       try:
-        self._on_node_update(node, from_initial_sync=True)
+        user_data = node.get("user", {})
+        synced_id = str(user_data.get("id") or node.get("id"))
+
+        if synced_id not in known_ids and not _has_identity(user_data):
+          logging.debug("Ignoring identity-less NODEINFO for node %s", synced_id)
+          continue
+
+        nodes.append({"node_id": synced_id, "last_seen": last_seen, **_node_fields(node)})
       except Exception:
         logging.exception("Error during initial sync for node_id=%s", node_id)
 
-    logging.info("Initial node sync complete")
+    try:
+      self.storage.bulk_upsert_nodes(nodes)
+    except Exception:
+      logging.exception("Failed to store nodes during initial sync")
+      return
+
+    logging.info("Initial node sync complete (%d nodes stored)", len(nodes))
 
 
 
@@ -209,48 +370,25 @@ class MeshtasticCollector:
 
     if not node_id:
       logging.warning(
-        "Received node data without id (snippet: %s)",
-        repr(node_data)[:200],
+        "Received node data without id (snippet: %.200r)",
+        node_data,
       )
       return
 
-    has_identity = bool(
-      user_data.get("longName")
-      or user_data.get("shortName")
-      or user_data.get("hwModel")
-      or user_data.get("role")
-      or user_data.get("publicKey")
-    )
-
-    existing = self.storage.get_node(node_id) or {}
-    is_new_node = not existing
+    existing = self.storage.get_node(node_id)
+    is_new_node = existing is None
 
     if is_new_node:
       if not identity_allowed:
         logging.debug("Ignoring %s update for unknown node %s", portnum, node_id)
         return
-      if not has_identity:
+      if not _has_identity(user_data):
         logging.debug("Ignoring identity-less NODEINFO for node %s", node_id)
         return
 
-    device_metrics = node_data.get("deviceMetrics", {})
-    position = node_data.get("position", {})
-
-    merged = self._merge_node_data(node_id, {
-      "short_name": user_data.get("shortName"),
-      "long_name": user_data.get("longName"),
-      "hardware": user_data.get("hwModel"),
-      "role": user_data.get("role"),
-      "snr": node_data.get("snr"),
-      "rssi": node_data.get("rssi"),
-      "battery_level": device_metrics.get("batteryLevel"),
-      "voltage": device_metrics.get("voltage"),
-      "latitude": position.get("latitude"),
-      "longitude": position.get("longitude"),
-      "altitude": position.get("altitude"),
-    })
-
-    self.storage.upsert_node(node_id=node_id, **merged)
+    new_data = _node_fields(node_data)
+
+    self.storage.upsert_node(node_id=node_id, last_seen=int(time.time()), **new_data)
 
     if from_initial_sync:
       logging.debug("Initial sync: node %s inserted/updated", node_id)
@@ -258,20 +396,14 @@ class MeshtasticCollector:
 
     # Log new node discovery with initial data
     if is_new_node:
-      initial_data = {k: v for k, v in merged.items() if v is not None and k != "last_seen"}
+      initial_data = {k: v for k, v in new_data.items() if v is not None}
       logging.info("New node discovered: %s %s", node_id, initial_data)
       return
 
     # Log only fields that actually changed for existing nodes
     changed = {}
-    for key in (
-      "short_name", "long_name", "hardware", "role",
-      "battery_level", "voltage", "snr", "rssi",
-      "latitude", "longitude", "altitude",
-    ):
-      old = existing.get(key)
-      new = merged.get(key)
-      if old != new:
+    for key, new in new_data.items():
+      if new is not None and existing[key] != new:
         changed[key] = new
 
     if changed:
@@ -314,15 +446,15 @@ class MeshtasticCollector:
 
 
 
-  def _handle_text_message(self, packet: dict, from_node_id: str) -> None:
+  def _handle_text_message(self, pkt: _Packet) -> None:
     """Route TEXT_MESSAGE_APP packets to channel or DM storage."""
-    decoded = packet.get("decoded", {})
-    text = decoded.get("text", "")
+    from_node_id = pkt.from_node_id
+    text = pkt.text
 
     logging.debug(
       "Captured text message from=%s channel=%s text=%r",
       from_node_id,
-      packet.get("channel"),
+      pkt.channel,
       text
     )
 
@@ -330,46 +462,33 @@ class MeshtasticCollector:
       logging.debug("Skip: empty text message from %s", from_node_id)
       return
 
-    to_id = packet.get("toId")
-    message_id = packet.get("id", 0)
-    rx_time = packet.get("rxTime", int(time.time()))
-    snr = packet.get("rxSnr")
-    rssi = packet.get("rxRssi")
-    hop_start = packet.get("hopStart")
-    hop_limit = packet.get("hopLimit")
-    hop_count = (hop_start - hop_limit) if hop_start and hop_limit else None
-    channel_index = packet.get("channel", 0)
-    reply_to = decoded.get("replyId")
-    via_mqtt = packet.get("viaMqtt", False)
+    to_id = pkt.to_id
+    channel_index = pkt.channel
 
     # Determine if DM or channel message
-    local_hex_id = f"!{int(self.local_node_id) & 0xFFFFFFFF:08x}" if self.local_node_id else None
     is_dm = (
       to_id is not None
       and to_id != "^all"
-      and to_id == local_hex_id
+      and to_id == self._local_hex_id
     )
 
     if is_dm:
-      if not Config.get("LOG_DIRECT_MESSAGES"):
+      if not self._log_dm:
         logging.debug("Skip: direct message logging disabled")
         return
 
       try:
-        inserted = self.storage.insert_direct_message(
-          message_id=message_id,
+        self.storage.insert_direct_message(
+          message_id=pkt.message_id,
           from_node=from_node_id,
           text=text,
-          rx_time=rx_time,
-          snr=snr,
-          rssi=rssi,
-          reply_to=reply_to,
-          via_mqtt=via_mqtt,
+          rx_time=pkt.rx_time,
+          snr=pkt.snr,
+          rssi=pkt.rssi,
+          reply_to=pkt.reply_to,
+          via_mqtt=pkt.via_mqtt,
         )
-        if inserted:
-          logging.info("DM from %s: %s", from_node_id, text[:100])
-        else:
-          logging.debug("Duplicate DM skipped: message_id=%s", message_id)
+        logging.debug("Queued DM from %s: message_id=%s", from_node_id, pkt.message_id)
       except Exception:
         logging.exception("Failed to insert DM from %s", from_node_id)
     else:
@@ -378,62 +497,35 @@ class MeshtasticCollector:
         return
 
       try:
-        inserted = self.storage.insert_message(
-          message_id=message_id,
+        self.storage.insert_message(
+          message_id=pkt.message_id,
           channel_index=channel_index,
           from_node=from_node_id,
           to_node=to_id,
           text=text,
-          rx_time=rx_time,
-          hop_count=hop_count,
-          snr=snr,
-          rssi=rssi,
-          reply_to=reply_to,
-          via_mqtt=via_mqtt,
+          rx_time=pkt.rx_time,
+          hop_count=pkt.hop_count,
+          snr=pkt.snr,
+          rssi=pkt.rssi,
+          reply_to=pkt.reply_to,
+          via_mqtt=pkt.via_mqtt,
         )
-        if inserted:
-          logging.info("CH%d %s: %s", channel_index, from_node_id, text[:100])
-        else:
-          logging.debug("Duplicate message skipped: message_id=%s", message_id)
+        logging.debug("Queued CH%d message from %s: message_id=%s", channel_index, from_node_id, pkt.message_id)
       except Exception:
         logging.exception("Failed to insert message from %s", from_node_id)
 
 
 
 
-  def _merge_node_data(self, node_id: str, new_data: dict) -> dict:
-    """Merge incoming node data with existing DB record, preferring new non-null values."""
-    row = self.storage.get_node(node_id) or {}
-    merged = {}
-
-    fields = [
-      "short_name", "long_name", "hardware", "role",
-      "last_seen", "battery_level", "voltage", "snr", "rssi",
-      "latitude", "longitude", "altitude"
-    ]
-
-    for field in fields:
-      if field in new_data and new_data[field] is not None:
-        merged[field] = new_data[field]
-      else:
-        merged[field] = row.get(field)
-
-    merged["last_seen"] = new_data.get("last_seen", int(time.time()))
-    return merged
-
-
-
-
   def _sync_channels(self) -> None:
     """
     Sync channels from device into database.
     Channels tracked: PRIMARY_CHANNEL if LOG_PRIMARY_CHANNEL=True, plus any in LOG_CHANNEL_IDS.
     """
-    primary_channel = Config.get("PRIMARY_CHANNEL", 0)
     logging.info(
       "Channel config: LOG_PRIMARY_CHANNEL=%s PRIMARY_CHANNEL=%s LOG_CHANNEL_IDS=%s",
       Config.get("LOG_PRIMARY_CHANNEL"),
-      primary_channel,
+      self._primary_channel,
       Config.get("LOG_CHANNEL_IDS"),
     )
 
@@ -454,18 +546,9 @@ class MeshtasticCollector:
         if isinstance(idx, int):
           device_channels[idx] = ch
 
-      tracked_indexes = set()
-
-      if Config.get("LOG_PRIMARY_CHANNEL", True):
-        tracked_indexes.add(primary_channel)
-
-      configured = Config.get("LOG_CHANNEL_IDS", [])
-      if configured:
-        tracked_indexes.update(configured)
+      logging.info("Config-tracked channel indexes: %s", sorted(self._tracked_channels))
 
-      logging.info("Config-tracked channel indexes: %s", sorted(tracked_indexes))
-
-      for idx in sorted(tracked_indexes):
+      for idx in sorted(self._tracked_channels):
         ch = device_channels.get(idx)
 
         name = None
@@ -477,7 +560,7 @@ class MeshtasticCollector:
               name = raw_name.strip()
 
         if not name:
-          if idx == primary_channel:
+          if idx == self._primary_channel:
             name = "Primary"
           else:
             name = f"Channel {idx}"
@@ -495,15 +578,7 @@ class MeshtasticCollector:
 
   def _should_log_channel(self, channel_index: int) -> bool:
     """Check if channel_index is configured for logging."""
-    primary_channel = Config.get("PRIMARY_CHANNEL", 0)
-    if Config.get("LOG_PRIMARY_CHANNEL") and channel_index == primary_channel:
-      return True
-
-    allowed_channels = Config.get("LOG_CHANNEL_IDS") or []
-    if channel_index in allowed_channels:
-      return True
-
-    return False
+    return channel_index in self._tracked_channels
 
 
 
@@ -529,8 +604,8 @@ def _configure_logging() -> None:
 
 def _install_signal_handlers(collector: MeshtasticCollector) -> None:
   def _handle_signal(signum, frame):
+    # Runs on the main thread, possibly mid-flush; only signal the loop to exit
     collector.stop()
-    sys.exit(0)
 
   signal.signal(signal.SIGINT, _handle_signal)
   signal.signal(signal.SIGTERM, _handle_signal)
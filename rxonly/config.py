@@ -9,6 +9,7 @@ from typing import Any
 DEFAULT_CONFIG = {
   "DEBUG": False,                # Enable verbose logging and disable css/js minification
   "DB_PATH": "data/db.sqlite",   # Path to SqLite database
+  "WRITER_SYNCHRONOUS": "NORMAL", # Collector SQLite sync mode: OFF, NORMAL, or FULL
   "MAX_MESSAGES": 1000,          # Max channel messages to keep across all channels
   "MAX_DIRECT_MESSAGES": 1000,   # Max direct messages to keep
   "PRUNE_INTERVAL": 5,           # Only attempt pruning every X writes
@@ -2,16 +2,57 @@ from __future__ import annotations
 
 import logging
 import sqlite3
+import threading
 import time
 
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 from rxonly.config import Config
 
 
 SCHEMA_FILE = Path(__file__).parent / "schema.sql"
 
+# Queued messages are written once this many are waiting, or on the next flush
+MESSAGE_BATCH_SIZE = 50
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL")
+
+# Hot-path statements. sqlite3 caches prepared statements keyed on the exact
+# SQL text, so keeping each one as a single constant guarantees cache hits.
+NODE_SELECT_SQL = "SELECT * FROM nodes WHERE node_id = ?"
+
+NODE_UPSERT_SQL = """INSERT INTO nodes
+   (node_id, short_name, long_name, hardware, role, last_seen,
+    battery_level, voltage, snr, rssi, latitude, longitude, altitude)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+   ON CONFLICT(node_id) DO UPDATE SET
+   short_name = COALESCE(excluded.short_name, short_name),
+   long_name = COALESCE(excluded.long_name, long_name),
+   hardware = COALESCE(excluded.hardware, hardware),
+   role = COALESCE(excluded.role, role),
+   last_seen = excluded.last_seen,
+   battery_level = COALESCE(excluded.battery_level, battery_level),
+   voltage = COALESCE(excluded.voltage, voltage),
+   snr = COALESCE(excluded.snr, snr),
+   rssi = COALESCE(excluded.rssi, rssi),
+   latitude = COALESCE(excluded.latitude, latitude),
+   longitude = COALESCE(excluded.longitude, longitude),
+   altitude = COALESCE(excluded.altitude, altitude)"""
+
+MESSAGE_INSERT_SQL = """INSERT OR IGNORE INTO messages
+   (message_id, channel_index, from_node, to_node, text, rx_time, hop_count, snr, rssi, reply_to, via_mqtt)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+DM_INSERT_SQL = """INSERT OR IGNORE INTO direct_messages
+   (message_id, from_node, text, rx_time, snr, rssi, reply_to, via_mqtt)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+
+CHANNEL_UPSERT_SQL = """INSERT INTO channels (channel_index, name)
+   VALUES (?, ?)
+   ON CONFLICT(channel_index) DO UPDATE SET
+   name = excluded.name"""
+
 
 
 
@@ -25,14 +66,29 @@ class Storage:
     self.conn = sqlite3.connect(
       self.db_path,
       check_same_thread=False,
+      cached_statements=256,
     )
     self.conn.row_factory = sqlite3.Row
 
+    # The collector's pubsub thread and its flush loop share this connection;
+    # every use of it, reads included, goes through this lock
+    self._write_lock = threading.RLock()
+    self._closed = False
+
+    synchronous = str(Config.get("WRITER_SYNCHRONOUS", "NORMAL")).upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+      logging.warning("Invalid WRITER_SYNCHRONOUS %r; using NORMAL", synchronous)
+      synchronous = "NORMAL"
+
     with self.conn:
       self.conn.execute("PRAGMA foreign_keys = ON;")
       self.conn.execute("PRAGMA journal_mode = WAL;")
-      self.conn.execute("PRAGMA synchronous = NORMAL;")
+      self.conn.execute(f"PRAGMA synchronous = {synchronous};")
       self.conn.execute("PRAGMA busy_timeout = 3000;")
+      self.conn.execute("PRAGMA cache_size = -65536;")      # 64MB page cache
+      self.conn.execute("PRAGMA mmap_size = 268435456;")    # 256MB memory map
+      self.conn.execute("PRAGMA temp_store = MEMORY;")
+      self.conn.execute("PRAGMA wal_autocheckpoint = 1000;")
 
     self._initialize_or_upgrade_database()
 
@@ -41,6 +97,14 @@ class Storage:
     self._dm_insert_count = 0
     self._prune_interval = Config.get("PRUNE_INTERVAL")
 
+    # Running row counts so pruning can be skipped while under the limits
+    self._messages_count: int = int(self.get_meta("messages_count") or 0)
+    self._dm_count: int = int(self.get_meta("direct_messages_count") or 0)
+
+    # Messages are queued and written in batches to avoid a commit per packet
+    self._msg_buffer: list[tuple] = []
+    self._dm_buffer: list[tuple] = []
+
 
 
 
@@ -105,20 +169,40 @@ class Storage:
 
 
   def get_meta(self, key: str) -> Optional[str]:
-    row = self.conn.execute(
-      "SELECT value FROM meta WHERE key = ?", (key,)
-    ).fetchone()
+    with self._write_lock:
+      row = self.conn.execute(
+        "SELECT value FROM meta WHERE key = ?", (key,)
+      ).fetchone()
     return row["value"] if row else None
 
 
 
 
   def set_meta(self, key: str, value: str) -> None:
-    with self.conn:
-      self.conn.execute(
-        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
-        (key, value),
-      )
+    """Store a meta value, committing it along with any pending writes."""
+    with self._write_lock:
+      with self.conn:
+        self.conn.execute(
+          "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+          (key, value),
+        )
+
+
+
+
+  def begin(self) -> None:
+    """Open a write transaction unless one is already in progress."""
+    with self._write_lock:
+      if not self.conn.in_transaction:
+        self.conn.execute("BEGIN IMMEDIATE")
+
+
+
+
+  def commit(self) -> None:
+    """Commit the current write transaction, if any."""
+    with self._write_lock:
+      self.conn.commit()
 
 
 
@@ -126,14 +210,9 @@ class Storage:
   def upsert_channel(self, channel_index: int, name: str) -> None:
     """Insert or update a channel."""
     try:
-      with self.conn:
-        self.conn.execute(
-          """INSERT INTO channels (channel_index, name)
-             VALUES (?, ?)
-             ON CONFLICT(channel_index) DO UPDATE SET
-             name = excluded.name""",
-          (channel_index, name)
-        )
+      with self._write_lock:
+        self.begin()
+        self.conn.execute(CHANNEL_UPSERT_SQL, (channel_index, name))
     except Exception:
       logging.exception("Failed to upsert channel")
 
@@ -153,27 +232,14 @@ class Storage:
     rssi: Optional[int],
     reply_to: Optional[int] = None,
     via_mqtt: bool = False,
-  ) -> bool:
-    """Insert channel message and periodically prune old messages.
-
-    Returns True if inserted, False if duplicate.
-    """
-    with self.conn:
-      cursor = self.conn.execute(
-        """INSERT OR IGNORE INTO messages
-           (message_id, channel_index, from_node, to_node, text, rx_time, hop_count, snr, rssi, reply_to, via_mqtt)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (message_id, channel_index, from_node, to_node, text, rx_time, hop_count, snr, rssi, reply_to, int(via_mqtt)),
+  ) -> None:
+    """Queue channel message for the next batched write."""
+    with self._write_lock:
+      self._msg_buffer.append(
+        (message_id, channel_index, from_node, to_node, text, rx_time, hop_count, snr, rssi, reply_to, int(via_mqtt))
       )
-      inserted = cursor.rowcount > 0
-
-    if inserted:
-      self._message_insert_count += 1
-      if self._message_insert_count >= self._prune_interval:
-        self._prune_messages()
-        self._message_insert_count = 0
-
-    return inserted
+      if len(self._msg_buffer) >= MESSAGE_BATCH_SIZE:
+        self.flush()
 
 
 
@@ -188,37 +254,181 @@ class Storage:
     rssi: Optional[int],
     reply_to: Optional[int] = None,
     via_mqtt: bool = False,
-  ) -> bool:
-    """Insert direct message and periodically prune old messages.
+  ) -> None:
+    """Queue direct message for the next batched write."""
+    with self._write_lock:
+      self._dm_buffer.append(
+        (message_id, from_node, text, rx_time, snr, rssi, reply_to, int(via_mqtt))
+      )
+      if len(self._dm_buffer) >= MESSAGE_BATCH_SIZE:
+        self.flush()
+
+
+
 
-    Returns True if inserted, False if duplicate.
+  def flush(self) -> None:
     """
-    with self.conn:
-      cursor = self.conn.execute(
-        """INSERT OR IGNORE INTO direct_messages
-           (message_id, from_node, text, rx_time, snr, rssi, reply_to, via_mqtt)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (message_id, from_node, text, rx_time, snr, rssi, reply_to, int(via_mqtt)),
+    Write all queued messages and commit pending writes.
+    Queued rows leave the queue only once the commit succeeds, so a failed
+    flush is retried in full on the next one.
+    """
+    with self._write_lock:
+      # Nothing can be written once close() has run
+      if self._closed:
+        return
+
+      new_messages: list[tuple] = []
+      duplicate_messages: list[tuple] = []
+      new_dms: list[tuple] = []
+      duplicate_dms: list[tuple] = []
+      if self._msg_buffer or self._dm_buffer:
+        self.begin()
+        self.conn.execute("SAVEPOINT flush_queued")
+        try:
+          new_messages, duplicate_messages = self._write_queued(
+            self._msg_buffer, "messages", MESSAGE_INSERT_SQL
+          )
+          new_dms, duplicate_dms = self._write_queued(
+            self._dm_buffer, "direct_messages", DM_INSERT_SQL
+          )
+        except Exception:
+          # Undo this flush's inserts but keep other pending writes in the
+          # transaction (unless SQLite already rolled the whole thing back)
+          if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK TO flush_queued")
+          raise
+        finally:
+          if self.conn.in_transaction:
+            self.conn.execute("RELEASE flush_queued")
+
+      try:
+        self.commit()
+      except Exception:
+        # A failed COMMIT may have rolled back on its own; make that certain so
+        # the still-queued rows are written afresh next time
+        self.conn.rollback()
+        raise
+
+      # Committed: the queued rows are done
+      self._msg_buffer.clear()
+      self._dm_buffer.clear()
+
+      for row in new_messages:
+        logging.info("CH%d %s: %.100s", row[1], row[2], row[4])
+      for row in duplicate_messages:
+        logging.debug("Duplicate message skipped: message_id=%s", row[0])
+      for row in new_dms:
+        logging.info("DM from %s: %.100s", row[1], row[2])
+      for row in duplicate_dms:
+        logging.debug("Duplicate DM skipped: message_id=%s", row[0])
+
+      if new_messages:
+        self._messages_count += len(new_messages)
+        self._message_insert_count += len(new_messages)
+        if self._message_insert_count >= self._prune_interval:
+          self._prune_messages()
+          self._message_insert_count = 0
+
+      if new_dms:
+        self._dm_count += len(new_dms)
+        self._dm_insert_count += len(new_dms)
+        if self._dm_insert_count >= self._prune_interval:
+          self._prune_direct_messages()
+          self._dm_insert_count = 0
+
+      if self.conn.in_transaction:
+        self.commit()
+
+
+
+
+  def _write_queued(
+    self, queue: list[tuple], table: str, insert_sql: str
+  ) -> tuple[list[tuple], list[tuple]]:
+    """
+    Insert queued rows (message_id first) with one executemany.
+    Returns (new rows, duplicate rows). Rows the database rejects outright
+    are dropped from the queue and logged; an OperationalError (locked, disk
+    full, I/O) propagates with the queue intact for flush() to roll back.
+    """
+    if not queue:
+      return [], []
+
+    # Note which message_ids are already stored, since executemany only reports a total
+    placeholders = ",".join("?" * len(queue))
+    stored = {
+      row["message_id"]
+      for row in self.conn.execute(
+        f"SELECT message_id FROM {table} WHERE message_id IN ({placeholders})",
+        [row[0] for row in queue],
       )
-      inserted = cursor.rowcount > 0
+    }
 
-    if inserted:
-      self._dm_insert_count += 1
-      if self._dm_insert_count >= self._prune_interval:
-        self._prune_direct_messages()
-        self._dm_insert_count = 0
+    self.conn.execute("SAVEPOINT queued_batch")
+    try:
+      self.conn.executemany(insert_sql, queue)
+    except sqlite3.OperationalError:
+      raise
+    except sqlite3.Error:
+      # Something in the batch is rejected; retry row by row to drop only that row
+      self.conn.execute("ROLLBACK TO queued_batch")
+      for row in list(queue):
+        self.conn.execute("SAVEPOINT queued_row")
+        try:
+          self.conn.execute(insert_sql, row)
+        except sqlite3.OperationalError:
+          raise
+        except sqlite3.Error as e:
+          self.conn.execute("ROLLBACK TO queued_row")
+          queue.remove(row)
+          logging.error("Dropping queued %s row, message_id=%s: %s", table, row[0], e)
+        self.conn.execute("RELEASE queued_row")
+    self.conn.execute("RELEASE queued_batch")
 
-    return inserted
+    new_rows: list[tuple] = []
+    duplicates: list[tuple] = []
+    for row in queue:
+      if row[0] in stored:
+        duplicates.append(row)
+      else:
+        stored.add(row[0])
+        new_rows.append(row)
+    return new_rows, duplicates
 
 
 
 
-  def get_node(self, node_id: str) -> Optional[dict]:
-    """Retrieve a node by its node_id."""
-    row = self.conn.execute(
-      "SELECT * FROM nodes WHERE node_id = ?", (node_id,)
-    ).fetchone()
-    return dict(row) if row else None
+  def get_node(self, node_id: str) -> Optional[sqlite3.Row]:
+    """Retrieve a node row by its node_id."""
+    with self._write_lock:
+      return self.conn.execute(NODE_SELECT_SQL, (node_id,)).fetchone()
+
+
+
+
+  def get_node_ids(self) -> set[str]:
+    """Return the node_id of every stored node."""
+    with self._write_lock:
+      return {row["node_id"] for row in self.conn.execute("SELECT node_id FROM nodes")}
+
+
+
+
+  def bulk_upsert_nodes(self, nodes: Iterable[dict]) -> None:
+    """Insert or update many nodes with a single executemany and commit."""
+    with self._write_lock:
+      self.begin()
+      self.conn.executemany(
+        NODE_UPSERT_SQL,
+        (
+          (
+            n["node_id"], n["short_name"], n["long_name"], n["hardware"], n["role"], n["last_seen"],
+            n["battery_level"], n["voltage"], n["snr"], n["rssi"], n["latitude"], n["longitude"], n["altitude"],
+          )
+          for n in nodes
+        ),
+      )
+      self.commit()
 
 
 
@@ -240,26 +450,10 @@ class Storage:
     altitude: Optional[int]
   ) -> None:
     """Insert or update a node, preserving non-null existing values."""
-    with self.conn:
+    with self._write_lock:
+      self.begin()
       cursor = self.conn.execute(
-        """INSERT INTO nodes
-           (node_id, short_name, long_name, hardware, role, last_seen,
-            battery_level, voltage, snr, rssi, latitude, longitude, altitude)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-           ON CONFLICT(node_id) DO UPDATE SET
-           short_name = COALESCE(excluded.short_name, short_name),
-           long_name = COALESCE(excluded.long_name, long_name),
-           hardware = COALESCE(excluded.hardware, hardware),
-           role = COALESCE(excluded.role, role),
-           last_seen = excluded.last_seen,
-           battery_level = COALESCE(excluded.battery_level, battery_level),
-           voltage = COALESCE(excluded.voltage, voltage),
-           snr = COALESCE(excluded.snr, snr),
-           rssi = COALESCE(excluded.rssi, rssi),
-           latitude = COALESCE(excluded.latitude, latitude),
-           longitude = COALESCE(excluded.longitude, longitude),
-           altitude = COALESCE(excluded.altitude, altitude)
-        """,
+        NODE_UPSERT_SQL,
         (
           node_id, short_name, long_name, hardware, role, last_seen,
           battery_level, voltage, snr, rssi, latitude, longitude, altitude,
@@ -267,11 +461,11 @@ class Storage:
       )
       inserted = cursor.rowcount > 0
 
-    if inserted:
-      self._node_insert_count += 1
-      if self._node_insert_count >= self._prune_interval:
-        self.prune_stale_nodes()
-        self._node_insert_count = 0
+      if inserted:
+        self._node_insert_count += 1
+        if self._node_insert_count >= self._prune_interval:
+          self.prune_stale_nodes()
+          self._node_insert_count = 0
 
 
 
@@ -279,16 +473,22 @@ class Storage:
   def _prune_messages(self) -> None:
     """Delete channel messages beyond MAX_MESSAGES limit."""
     max_messages = Config.get("MAX_MESSAGES")
-    with self.conn:
-      deleted = self.conn.execute(
-        """DELETE FROM messages
-           WHERE id NOT IN (
-               SELECT id FROM messages
-               ORDER BY rx_time DESC
-               LIMIT ?
-           )""",
-        (max_messages,),
-      ).rowcount
+    if self._messages_count <= max_messages:
+      return
+
+    # rx_time of the oldest message we keep; everything older goes
+    cutoff = self.conn.execute(
+      "SELECT rx_time FROM messages ORDER BY rx_time DESC LIMIT 1 OFFSET ?",
+      (max_messages - 1,),
+    ).fetchone()
+    if cutoff is None:
+      return
+
+    self.begin()
+    deleted = self.conn.execute(
+      "DELETE FROM messages WHERE rx_time < ?", (cutoff["rx_time"],)
+    ).rowcount
+    self._messages_count -= deleted
       
     if deleted:
       noun = "Message" if deleted == 1 else "Messages"
@@ -298,16 +498,22 @@ class Storage:
   def _prune_direct_messages(self) -> None:
     """Delete direct messages beyond MAX_DIRECT_MESSAGES limit."""
     max_dm = Config.get("MAX_DIRECT_MESSAGES")
-    with self.conn:
-      deleted = self.conn.execute(
-        """DELETE FROM direct_messages
-           WHERE id NOT IN (
-               SELECT id FROM direct_messages
-               ORDER BY rx_time DESC
-               LIMIT ?
-           )""",
-        (max_dm,),
-      ).rowcount
+    if self._dm_count <= max_dm:
+      return
+
+    # rx_time of the oldest direct message we keep; everything older goes
+    cutoff = self.conn.execute(
+      "SELECT rx_time FROM direct_messages ORDER BY rx_time DESC LIMIT 1 OFFSET ?",
+      (max_dm - 1,),
+    ).fetchone()
+    if cutoff is None:
+      return
+
+    self.begin()
+    deleted = self.conn.execute(
+      "DELETE FROM direct_messages WHERE rx_time < ?", (cutoff["rx_time"],)
+    ).rowcount
+    self._dm_count -= deleted
       
     if deleted:
       noun = "Direct message" if deleted == 1 else "Direct messages"
@@ -317,7 +523,8 @@ class Storage:
   def prune_stale_nodes(self) -> None:
     """Delete nodes not seen within NODE_PRUNE_DAYS."""
     cutoff = int(time.time()) - (Config.get("NODE_PRUNE_DAYS") * 86400)
-    with self.conn:
+    with self._write_lock:
+      self.begin()
       deleted = self.conn.execute("DELETE FROM nodes WHERE last_seen < ?", (cutoff,)).rowcount
 
       if deleted:
@@ -328,4 +535,13 @@ class Storage:
 
 
   def close(self) -> None:
-    self.conn.close()
+    with self._write_lock:
+      if self._closed:
+        return
+      try:
+        self.flush()
+        # Refresh planner statistics for the indexes used this session
+        self.conn.execute("PRAGMA optimize;")
+      finally:
+        self.conn.close()
+        self._closed = True
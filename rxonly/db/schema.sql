@@ -1,4 +1,4 @@
--- schema_version: 0.5.5
+-- schema_version: 0.5.12
 
 
 -- -------------------
@@ -29,9 +29,38 @@ CREATE TABLE IF NOT EXISTS nodes (
     altitude REAL
 );
 
--- Index to quickly find active nodes by last_seen
+-- Index to quickly find active nodes by last_seen; also drives the
+-- (last_seen, node_id) keyset order of node listings without a sort step
 CREATE INDEX IF NOT EXISTS idx_nodes_last_seen
-ON nodes (last_seen);
+ON nodes (last_seen, node_id);
+
+-- Substring search over node ids and names (trigram FTS5, external content)
+CREATE VIRTUAL TABLE IF NOT EXISTS nodes_fts USING fts5(
+    node_id, short_name, long_name,
+    content='nodes', content_rowid='rowid', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS nodes_fts_ai AFTER INSERT ON nodes
+BEGIN
+    INSERT INTO nodes_fts (rowid, node_id, short_name, long_name)
+    VALUES (new.rowid, new.node_id, new.short_name, new.long_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS nodes_fts_ad AFTER DELETE ON nodes
+BEGIN
+    INSERT INTO nodes_fts (nodes_fts, rowid, node_id, short_name, long_name)
+    VALUES ('delete', old.rowid, old.node_id, old.short_name, old.long_name);
+END;
+
+-- Only reindex when a name actually changes, not on every last_seen bump
+CREATE TRIGGER IF NOT EXISTS nodes_fts_au AFTER UPDATE OF short_name, long_name ON nodes
+WHEN old.short_name IS NOT new.short_name OR old.long_name IS NOT new.long_name
+BEGIN
+    INSERT INTO nodes_fts (nodes_fts, rowid, node_id, short_name, long_name)
+    VALUES ('delete', old.rowid, old.node_id, old.short_name, old.long_name);
+    INSERT INTO nodes_fts (rowid, node_id, short_name, long_name)
+    VALUES (new.rowid, new.node_id, new.short_name, new.long_name);
+END;
 
 
 -- -------------------
@@ -39,7 +68,9 @@ ON nodes (last_seen);
 -- -------------------
 CREATE TABLE IF NOT EXISTS channels (
     channel_index INTEGER PRIMARY KEY,
-    name TEXT NOT NULL
+    name TEXT NOT NULL,
+    -- Maintained by the messages triggers below
+    message_count INTEGER NOT NULL DEFAULT 0
 );
 
 
@@ -61,14 +92,18 @@ CREATE TABLE IF NOT EXISTS messages (
     via_mqtt INTEGER DEFAULT 0
 );
 
--- Covering index for channel message lists (filter, order, JOIN keys)
+-- Covering index for channel message lists (filter, (rx_time, id) keyset order, JOIN keys)
 CREATE INDEX IF NOT EXISTS idx_messages_channel_covering
-ON messages (channel_index, rx_time DESC, id, message_id, from_node, reply_to, via_mqtt);
+ON messages (channel_index, rx_time DESC, id DESC, message_id, from_node, reply_to, via_mqtt);
 
 -- Reply-to JOIN optimization
 CREATE INDEX IF NOT EXISTS idx_messages_reply_to
 ON messages (reply_to);
 
+-- Keyset pagination order (rx_time, id) and prune cutoff lookup / range delete
+CREATE INDEX IF NOT EXISTS idx_messages_rxtime_id
+ON messages (rx_time, id);
+
 
 -- -------------------
 -- Direct messages table
@@ -85,10 +120,68 @@ CREATE TABLE IF NOT EXISTS direct_messages (
     via_mqtt INTEGER DEFAULT 0
 );
 
--- Covering index for DM lists (order, JOIN keys)
+-- Covering index for DM lists (keyset order in either direction, JOIN keys)
 CREATE INDEX IF NOT EXISTS idx_dms_covering
-ON direct_messages (rx_time DESC, id, message_id, from_node, reply_to, via_mqtt);
+ON direct_messages (rx_time, id, message_id, from_node, reply_to, via_mqtt);
 
 -- Reply-to JOIN optimization
 CREATE INDEX IF NOT EXISTS idx_dms_reply_to
 ON direct_messages (reply_to);
+
+
+-- -------------------
+-- Row counters
+-- -------------------
+-- Table sizes kept in meta so totals are a key lookup instead of a COUNT(*) scan.
+-- Per-channel message counts live on channels.message_count the same way.
+INSERT OR IGNORE INTO meta (key, value) VALUES
+    ('nodes_count', 0),
+    ('channels_count', 0),
+    ('messages_count', 0),
+    ('direct_messages_count', 0);
+
+CREATE TRIGGER IF NOT EXISTS nodes_ai AFTER INSERT ON nodes
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'nodes_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS nodes_ad AFTER DELETE ON nodes
+BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'nodes_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS channels_ai AFTER INSERT ON channels
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'channels_count';
+    -- Messages can arrive before their channel is known; seed from them once
+    UPDATE channels SET message_count = (
+        SELECT COUNT(*) FROM messages WHERE channel_index = new.channel_index
+    ) WHERE channel_index = new.channel_index;
+END;
+
+CREATE TRIGGER IF NOT EXISTS channels_ad AFTER DELETE ON channels
+BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'channels_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'messages_count';
+    UPDATE channels SET message_count = message_count + 1 WHERE channel_index = new.channel_index;
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages
+BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'messages_count';
+    UPDATE channels SET message_count = message_count - 1 WHERE channel_index = old.channel_index;
+END;
+
+CREATE TRIGGER IF NOT EXISTS direct_messages_ai AFTER INSERT ON direct_messages
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'direct_messages_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS direct_messages_ad AFTER DELETE ON direct_messages
+BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'direct_messages_count';
+END;
@@ -0,0 +1,15 @@
+from functools import lru_cache
+from typing import Union
+
+
+@lru_cache(maxsize=4096)
+def node_num_to_hex_id(node_num: Union[int, str]) -> str:
+  """
+  Convert decimal nodeNum to hex node_id format (e.g., '1234567890' -> '!499602d2').
+  Ints always convert; a non-numeric string (e.g. an existing '!id') is returned as is.
+  """
+  try:
+    num = int(node_num)
+    return f"!{num & 0xFFFFFFFF:08x}"
+  except (ValueError, TypeError):
+    return node_num
@@ -1,7 +1,10 @@
+import atexit
+
 from flask import Flask, Response
 from flask_compress import Compress
 
 from rxonly.config import Config
+from rxonly.web.db import ReadPool, release_db_connection
 from rxonly.web.routes import api_bp, dashboard_bp
 
 
@@ -10,6 +13,13 @@ def create_app() -> Flask:
 
   app = Flask(__name__)
   app.config["DEBUG"] = Config.get("DEBUG", False)
+
+  # Read-only connections shared by all request handlers in this worker
+  read_pool = ReadPool()
+  app.extensions["read_pool"] = read_pool
+  app.teardown_appcontext(release_db_connection)
+  # Close pooled connections when the worker process exits
+  atexit.register(read_pool.close)
   
   app.register_blueprint(api_bp)
   app.register_blueprint(dashboard_bp)
@@ -1,10 +1,29 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+
+from typing import Any, Optional
+
+from flask import current_app, g
 
 from rxonly.config import Config
+from rxonly.util import node_num_to_hex_id
 
 
+# Upper bound on read connections held open by each web worker
+READ_POOL_SIZE: int = min(32, (os.cpu_count() or 1) * 4)
 
-def get_db_connection() -> sqlite3.Connection:
+# Seconds to reuse the local node id before re-reading it from meta
+LOCAL_NODE_ID_TTL: float = 30.0
+
+# (expires_at, local node id) shared by all requests in this worker
+_local_node_id_cache: tuple[float, Optional[str]] = (0.0, None)
+
+
+
+def _open_read_connection() -> sqlite3.Connection:
   db_path: str = Config.get("DB_PATH")
   uri: str = f"file:{db_path}?mode=ro"
 
@@ -12,10 +31,302 @@ def get_db_connection() -> sqlite3.Connection:
     uri,
     uri=True,
     timeout=2.5,
+    cached_statements=256,
+    check_same_thread=False,
   )
-  
+
   conn.row_factory = sqlite3.Row
   conn.execute("PRAGMA query_only = ON;")
   conn.execute("PRAGMA busy_timeout = 2500;")
+  conn.execute("PRAGMA mmap_size = 268435456;")  # Share the OS page cache with the collector
+  conn.execute("PRAGMA cache_size = -16384;")  # 16 MiB per connection; the pool holds several
+  conn.execute("PRAGMA temp_store = MEMORY;")
+
+  return conn
+
+
+
+class ReadPool:
+  """
+  Thread-safe pool of read-only SQLite connections.
+  Connections are opened lazily up to `size` and reused across requests.
+  """
+
+  def __init__(self, size: int = READ_POOL_SIZE) -> None:
+    self.size = size
+    self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+    self._opened = 0
+    self._lock = threading.Lock()
+
+
+  def acquire(self) -> sqlite3.Connection:
+    """Take an idle connection, opening a new one if the pool isn't full."""
+    try:
+      return self._idle.get_nowait()
+    except queue.Empty:
+      pass
+
+    with self._lock:
+      if self._opened < self.size:
+        conn = _open_read_connection()
+        self._opened += 1
+        return conn
+
+    return self._idle.get()
+
+
+  def release(self, conn: sqlite3.Connection) -> None:
+    """Return a connection to the pool."""
+    self._idle.put(conn)
+
+
+  def close(self) -> None:
+    """Close all idle connections."""
+    while True:
+      try:
+        conn = self._idle.get_nowait()
+      except queue.Empty:
+        break
+      conn.close()
+      with self._lock:
+        self._opened -= 1
+
+
+
+def get_db_connection() -> sqlite3.Connection:
+  """
+  Return this request's read-only connection, borrowing one from the
+  app's pool on first use. Released by `release_db_connection` at teardown.
+  """
+  conn: Optional[sqlite3.Connection] = g.get("_db")
+  if conn is None:
+    conn = current_app.extensions["read_pool"].acquire()
+    g._db = conn
 
   return conn
+
+
+
+def release_db_connection(exc: Optional[BaseException] = None) -> None:
+  """Return the request's connection (if one was borrowed) to the pool."""
+  conn: Optional[sqlite3.Connection] = g.pop("_db", None)
+  if conn is not None:
+    current_app.extensions["read_pool"].release(conn)
+
+
+
+def get_local_node_id(conn: sqlite3.Connection) -> Optional[str]:
+  """
+  Return the collector's node id in hex form (e.g. '!499602d2'), or None if
+  it hasn't been recorded yet. Cached for LOCAL_NODE_ID_TTL seconds so a
+  collector restart on a different device still shows up.
+  """
+  global _local_node_id_cache
+
+  expires_at, node_id = _local_node_id_cache
+  now: float = time.monotonic()
+  if now < expires_at:
+    return node_id
+
+  row = conn.execute("SELECT value FROM meta WHERE key = 'local_node_id'").fetchone()
+  # meta table stores decimal nodeNum, nodes table uses hex format
+  node_id = node_num_to_hex_id(row["value"]) if row else None
+
+  _local_node_id_cache = (now + LOCAL_NODE_ID_TTL, node_id)
+  return node_id
+
+
+
+def fetch_dicts(cur: sqlite3.Cursor) -> list[dict[str, Any]]:
+  """Fetch the remaining rows of a query as dicts, binding column names once."""
+  columns: list[str] = [col[0] for col in cur.description]
+  return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+
+def get_counts(conn: sqlite3.Connection, *tables: str) -> dict[str, int]:
+  """
+  Read table row counts maintained in the meta table by the schema's triggers.
+  Returns a dict keyed by table name.
+  """
+  keys: list[str] = [f"{table}_count" for table in tables]
+  placeholders: str = ", ".join("?" * len(keys))
+  rows = conn.execute(
+    f"SELECT key, CAST(value AS INTEGER) AS count FROM meta WHERE key IN ({placeholders})",
+    keys,
+  ).fetchall()
+  counts: dict[str, int] = {row["key"]: row["count"] for row in rows}
+
+  return {table: counts.get(f"{table}_count", 0) for table in tables}
+
+
+
+def attach_reply_parents(conn: sqlite3.Connection, rows: list[dict[str, Any]], table: str) -> None:
+  """
+  Fill the reply_to_* fields of message rows from their parents in `table`.
+  Parents for the whole page are fetched in one batched lookup.
+  """
+  reply_ids: list[int] = list({row["reply_to"] for row in rows if row["reply_to"] is not None})
+
+  parents: dict[int, sqlite3.Row] = {}
+  if reply_ids:
+    placeholders: str = ", ".join("?" * len(reply_ids))
+    cur = conn.execute(
+      f"""
+      SELECT p.message_id, p.text, p.from_node, n.short_name
+      FROM {table} p
+      LEFT JOIN nodes n ON p.from_node = n.node_id
+      WHERE p.message_id IN ({placeholders})
+      """,
+      reply_ids,
+    )
+    parents = {parent["message_id"]: parent for parent in cur.fetchall()}
+
+  for row in rows:
+    parent: Optional[sqlite3.Row] = parents.get(row["reply_to"])
+    row["reply_to_text"] = parent["text"] if parent else None
+    row["reply_to_from_node"] = parent["from_node"] if parent else None
+    row["reply_to_from_node_short_name"] = parent["short_name"] if parent else None
+
+
+
+# Cursor comparison and scan direction for each message pagination mode
+MESSAGE_PAGE_MODES: dict[str, tuple[Optional[str], str]] = {
+  "oldest": (None, "ASC"),
+  "newest": (None, "DESC"),
+  "after": (">", "ASC"),
+  "before": ("<", "DESC"),
+}
+
+
+
+def message_page_mode(newest: bool, after_rx_time: Optional[int], before_rx_time: Optional[int]) -> str:
+  """Pick the page shape from the request's cursor params; newest ignores any cursor."""
+  if newest:
+    return "newest"
+  if after_rx_time is not None:
+    return "after"
+  if before_rx_time is not None:
+    return "before"
+  return "oldest"
+
+
+
+class MessagePager:
+  """
+  Keyset pagination over a message table in (rx_time, id) order, with the
+  sender's names joined from nodes and reply parents attached.
+  Page and boundary-probe SQL is built once per table, so every request of
+  the same shape reuses identical SQL text and hits the statement cache.
+  """
+
+  def __init__(self, table: str, alias: str, columns: list[str], filter_column: Optional[str] = None) -> None:
+    self.table = table
+    self.alias = alias
+    self.columns = columns
+    self.filter_column = filter_column
+
+    filtered_options: tuple[bool, ...] = (False, True) if filter_column else (False,)
+    self._page_sql: dict[tuple[str, bool], str] = {
+      (mode, filtered): self._build_page_sql(mode, filtered)
+      for mode in MESSAGE_PAGE_MODES
+      for filtered in filtered_options
+    }
+    # Probes for rows past a page boundary, keyed by (comparison, filtered)
+    self._probe_sql: dict[tuple[str, bool], str] = {
+      (op, filtered): self._build_probe_sql(op, filtered)
+      for op in ("<", ">")
+      for filtered in filtered_options
+    }
+
+
+  def _where(self, filtered: bool, cursor_condition: Optional[str]) -> str:
+    where_parts: list[str] = [f"{self.alias}.{self.filter_column} = ?"] if filtered else []
+    if cursor_condition:
+      where_parts.append(cursor_condition)
+    return ("WHERE " + " AND ".join(where_parts)) if where_parts else ""
+
+
+  def _build_page_sql(self, mode: str, filtered: bool) -> str:
+    cursor_op, direction = MESSAGE_PAGE_MODES[mode]
+    a: str = self.alias
+    select_list: str = ", ".join(f"{a}.{col}" for col in self.columns)
+    cursor_condition: Optional[str] = f"{a}.rx_time {cursor_op} ?" if cursor_op else None
+
+    return f"""
+      SELECT {select_list},
+             n.long_name AS from_node_long_name,
+             n.short_name AS from_node_short_name
+      FROM {self.table} {a}
+      LEFT JOIN nodes n ON {a}.from_node = n.node_id
+      {self._where(filtered, cursor_condition)}
+      ORDER BY {a}.rx_time {direction}, {a}.id {direction}
+      LIMIT ?
+    """
+
+
+  def _build_probe_sql(self, op: str, filtered: bool) -> str:
+    # Row-value comparison seeks the (rx_time, id) indexes; LIMIT 1 stops at the first match
+    a: str = self.alias
+    cursor_condition: str = f"({a}.rx_time, {a}.id) {op} (?, ?)"
+    return f"SELECT 1 FROM {self.table} {a} {self._where(filtered, cursor_condition)} LIMIT 1"
+
+
+  def fetch(
+    self,
+    conn: sqlite3.Connection,
+    mode: str,
+    cursor_rx_time: Optional[int],
+    limit: int,
+    filter_value: Any = None,
+  ) -> tuple[list[dict[str, Any]], bool, bool]:
+    """
+    Fetch one page for `mode` (see message_page_mode), oldest-first.
+    Rows are filtered on filter_column when filter_value is given.
+    Returns (rows, has_more_older, has_more_newer).
+    """
+    filtered: bool = self.filter_column is not None and filter_value is not None
+    filter_params: list[Any] = [filter_value] if filtered else []
+
+    params: list[Any] = list(filter_params)
+    if mode in ("after", "before"):
+      params.append(cursor_rx_time)
+    # One extra row tells us whether there is more in the scanned direction
+    params.append(limit + 1)
+
+    cur = conn.execute(self._page_sql[(mode, filtered)], params)
+    rows: list[dict[str, Any]] = fetch_dicts(cur)
+
+    has_more_scanned: bool = len(rows) > limit
+    if has_more_scanned:
+      rows.pop()
+
+    attach_reply_parents(conn, rows, self.table)
+
+    # Reverse DESC results so output is always oldest-first (ASC)
+    descending: bool = MESSAGE_PAGE_MODES[mode][1] == "DESC"
+    if descending:
+      rows.reverse()
+
+    has_more_older: bool = has_more_scanned and descending
+    has_more_newer: bool = has_more_scanned and not descending
+
+    # Pages without a cursor start at one end of the table. After a cursor,
+    # probe past the boundary row on the side that wasn't scanned.
+    if rows and mode in ("after", "before"):
+      if descending:
+        boundary: dict[str, Any] = rows[-1]
+        probe_sql: str = self._probe_sql[(">", filtered)]
+      else:
+        boundary = rows[0]
+        probe_sql = self._probe_sql[("<", filtered)]
+
+      found: bool = conn.execute(
+        probe_sql, filter_params + [boundary["rx_time"], boundary["id"]]
+      ).fetchone() is not None
+      if descending:
+        has_more_newer = found
+      else:
+        has_more_older = found
+
+    return rows, has_more_older, has_more_newer
@@ -1,7 +1,24 @@
-from flask import Blueprint
+from typing import Any
+
+import orjson
+from flask import Blueprint, Response, request
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+
+def json_response(payload: Any, status: int = 200) -> Response:
+  """Serialize a payload with orjson; `?pretty=1` indents it for reading by hand."""
+  option: int = orjson.OPT_NON_STR_KEYS
+  if request.args.get("pretty") == "1":
+    option |= orjson.OPT_INDENT_2
+
+  return Response(
+    orjson.dumps(payload, option=option),
+    status=status,
+    mimetype="application/json",
+  )
+
+
 from rxonly.web.routes.api import nodes
 from rxonly.web.routes.api import messages
 from rxonly.web.routes.api import channels
@@ -1,9 +1,8 @@
-import json
 from typing import Any
 
 from flask import Response
 
-from rxonly.web.routes.api import api_bp
+from rxonly.web.routes.api import api_bp, json_response
 from rxonly.web.db import get_db_connection
 
 
@@ -12,26 +11,22 @@ from rxonly.web.db import get_db_connection
 def get_channels() -> Response:
 
   conn = get_db_connection()
-  try:
-    cur = conn.cursor()
-
-    cur.execute(
-      """
-      SELECT channel_index, name
-      FROM channels
-      ORDER BY channel_index ASC
-      """
-    )
+  cur = conn.cursor()
+
+  cur.execute(
+    """
+    SELECT channel_index, name
+    FROM channels
+    ORDER BY channel_index ASC
+    """
+  )
 
-    rows: list[dict[str, Any]] = [dict(row) for row in cur.fetchall()]
-  finally:
-    conn.close()
+  rows: list[dict[str, Any]] = [
+    {"channel_index": row[0], "name": row[1]} for row in cur.fetchall()
+  ]
 
   payload: dict[str, Any] = {
     "channels": rows,
   }
 
-  return Response(
-    json.dumps(payload, indent=2),
-    mimetype="application/json",
-  )
+  return json_response(payload)
@@ -1,11 +1,20 @@
-import json
 from typing import Any, Optional
 
 from flask import request, Response
 
 from rxonly.config import Config
-from rxonly.web.routes.api import api_bp
-from rxonly.web.db import get_db_connection
+from rxonly.web.routes.api import api_bp, json_response
+from rxonly.web.db import MessagePager, get_counts, get_db_connection, message_page_mode
+
+
+
+# Page queries for the direct_messages table
+DM_PAGER = MessagePager(
+  "direct_messages",
+  "dm",
+  ["id", "message_id", "from_node", "text", "rx_time",
+   "snr", "rssi", "reply_to", "via_mqtt"],
+)
 
 
 
@@ -20,7 +29,7 @@ def get_direct_messages() -> Response:
       },
       "direct_messages": [],
     }
-    return Response(json.dumps(payload, indent=2), mimetype="application/json")
+    return json_response(payload)
 
   max_direct_messages: int = Config.get("MAX_DIRECT_MESSAGES", 1000)
 
@@ -37,82 +46,14 @@ def get_direct_messages() -> Response:
     limit = max_direct_messages
 
   conn = get_db_connection()
-  try:
-    cur = conn.cursor()
-
-    # Build WHERE clause parts
-    where_parts: list[str] = []
-    params: list[Any] = []
-
-    if after_rx_time is not None and not newest:
-      where_parts.append("dm.rx_time > ?")
-      params.append(after_rx_time)
-    elif before_rx_time is not None and not newest:
-      where_parts.append("dm.rx_time < ?")
-      params.append(before_rx_time)
-
-    where_clause = (" WHERE " + " AND ".join(where_parts)) if where_parts else ""
-
-    # Total count (unfiltered by cursor)
-    cur.execute("SELECT COUNT(*) AS count FROM direct_messages")
-    total: int = cur.fetchone()["count"]
-
-    # Determine sort order
-    if newest or before_rx_time is not None:
-      order_clause = "ORDER BY dm.rx_time DESC, dm.id DESC"
-    else:
-      order_clause = "ORDER BY dm.rx_time ASC, dm.id ASC"
-
-    query = f"""
-      SELECT dm.id, dm.message_id, dm.from_node, dm.text, dm.rx_time,
-             dm.snr, dm.rssi, dm.reply_to, dm.via_mqtt,
-             n.long_name AS from_node_long_name,
-             n.short_name AS from_node_short_name,
-             parent.text AS reply_to_text,
-             parent.from_node AS reply_to_from_node,
-             pn.short_name AS reply_to_from_node_short_name
-      FROM direct_messages dm
-      LEFT JOIN nodes n ON dm.from_node = n.node_id
-      LEFT JOIN direct_messages parent ON dm.reply_to = parent.message_id
-      LEFT JOIN nodes pn ON parent.from_node = pn.node_id
-      {where_clause}
-      {order_clause}
-      LIMIT ?
-    """
-    params.append(limit)
-
-    cur.execute(query, params)
-    rows: list[dict[str, Any]] = [dict(row) for row in cur.fetchall()]
-
-    # Reverse DESC results so output is always oldest-first (ASC)
-    if newest or before_rx_time is not None:
-      rows.reverse()
-
-    # Determine has_more_older / has_more_newer
-    has_more_older = False
-    has_more_newer = False
 
-    if rows:
-      oldest_rx_time = rows[0]["rx_time"]
-      newest_rx_time = rows[-1]["rx_time"]
-      oldest_id = rows[0]["id"]
-      newest_id = rows[-1]["id"]
+  # Total count (unfiltered by cursor)
+  total: int = get_counts(conn, "direct_messages")["direct_messages"]
 
-      # LIMIT 1 stops at first match
-      cur.execute(
-        "SELECT 1 FROM direct_messages dm WHERE (dm.rx_time < ? OR (dm.rx_time = ? AND dm.id < ?)) LIMIT 1",
-        (oldest_rx_time, oldest_rx_time, oldest_id),
-      )
-      has_more_older = cur.fetchone() is not None
+  mode: str = message_page_mode(newest, after_rx_time, before_rx_time)
+  cursor_rx_time: Optional[int] = after_rx_time if mode == "after" else before_rx_time
 
-      cur.execute(
-        "SELECT 1 FROM direct_messages dm WHERE (dm.rx_time > ? OR (dm.rx_time = ? AND dm.id > ?)) LIMIT 1",
-        (newest_rx_time, newest_rx_time, newest_id),
-      )
-      has_more_newer = cur.fetchone() is not None
-
-  finally:
-    conn.close()
+  rows, has_more_older, has_more_newer = DM_PAGER.fetch(conn, mode, cursor_rx_time, limit)
 
   payload: dict[str, Any] = {
     "meta": {
@@ -125,10 +66,7 @@ def get_direct_messages() -> Response:
     "direct_messages": rows,
   }
 
-  return Response(
-    json.dumps(payload, indent=2),
-    mimetype="application/json",
-  )
+  return json_response(payload)
 
 
 @api_bp.route("/direct-messages/<int:message_id>", methods=["GET"])
@@ -136,44 +74,30 @@ def get_direct_message(message_id: int) -> Response:
   """Return a single direct message by message_id with enriched node names."""
 
   if not Config.get("LOG_DIRECT_MESSAGES"):
-    return Response(
-      json.dumps({"error": "Direct message not found"}),
-      status=404,
-      mimetype="application/json",
-    )
+    return json_response({"error": "Direct message not found"}, status=404)
 
   conn = get_db_connection()
-  try:
-    cur = conn.cursor()
-    cur.execute(
-      """
-      SELECT dm.id, dm.message_id, dm.from_node, dm.text, dm.rx_time,
-             dm.snr, dm.rssi, dm.reply_to, dm.via_mqtt,
-             n.long_name AS from_node_long_name,
-             n.short_name AS from_node_short_name,
-             parent.text AS reply_to_text,
-             parent.from_node AS reply_to_from_node,
-             pn.short_name AS reply_to_from_node_short_name
-      FROM direct_messages dm
-      LEFT JOIN nodes n ON dm.from_node = n.node_id
-      LEFT JOIN direct_messages parent ON dm.reply_to = parent.message_id
-      LEFT JOIN nodes pn ON parent.from_node = pn.node_id
-      WHERE dm.message_id = ?
-      """,
-      (message_id,),
-    )
-    row = cur.fetchone()
-  finally:
-    conn.close()
+  cur = conn.cursor()
+  cur.execute(
+    """
+    SELECT dm.id, dm.message_id, dm.from_node, dm.text, dm.rx_time,
+           dm.snr, dm.rssi, dm.reply_to, dm.via_mqtt,
+           n.long_name AS from_node_long_name,
+           n.short_name AS from_node_short_name,
+           parent.text AS reply_to_text,
+           parent.from_node AS reply_to_from_node,
+           pn.short_name AS reply_to_from_node_short_name
+    FROM direct_messages dm
+    LEFT JOIN nodes n ON dm.from_node = n.node_id
+    LEFT JOIN direct_messages parent ON dm.reply_to = parent.message_id
+    LEFT JOIN nodes pn ON parent.from_node = pn.node_id
+    WHERE dm.message_id = ?
+    """,
+    (message_id,),
+  )
+  row = cur.fetchone()
 
   if row is None:
-    return Response(
-      json.dumps({"error": "Direct message not found"}),
-      status=404,
-      mimetype="application/json",
-    )
-
-  return Response(
-    json.dumps(dict(row), indent=2),
-    mimetype="application/json",
-  )
+    return json_response({"error": "Direct message not found"}, status=404)
+
+  return json_response(dict(row))
@@ -1,10 +1,13 @@
-import json
 from typing import Any, Optional
 
 from flask import request, Response
 
-from rxonly.web.routes.api import api_bp
-from rxonly.web.db import get_db_connection
+from rxonly.web.routes.api import api_bp, json_response
+from rxonly.web.db import fetch_dicts, get_counts, get_db_connection
+
+
+# Shortest search term the trigram FTS index can match
+FTS_MIN_SEARCH_LENGTH: int = 3
 
 
 
@@ -15,6 +18,10 @@ def get_nodes() -> Response:
   offset: int = request.args.get("offset", default=0, type=int)
   search: Optional[str] = request.args.get("search", default=None, type=str)
 
+  # Keyset pagination: continue after the (last_seen, node_id) of the previous page
+  after_last_seen: Optional[int] = request.args.get("after_last_seen", type=int)
+  after_node_id: Optional[str] = request.args.get("after_node_id", default=None, type=str)
+
   if limit < 0:
     limit = 0
   if limit > 1000:
@@ -22,101 +29,114 @@ def get_nodes() -> Response:
   if offset < 0:
     offset = 0
 
+  # The cursor is a pair; half of one would silently restart at page one
+  if (after_last_seen is None) != (after_node_id is None):
+    return json_response(
+      {"error": "after_last_seen and after_node_id must be given together"},
+      status=400,
+    )
+
+  # A cursor already positions the page; an offset on top would skip rows twice
+  use_cursor: bool = after_last_seen is not None
+  if use_cursor:
+    offset = 0
+
   conn = get_db_connection()
-  try:
-    cur = conn.cursor()
-
-    if search:
-      search_pattern: str = f"%{search}%"
-
-      cur.execute(
-        """
-        SELECT COUNT(*) AS count FROM nodes
-        WHERE node_id LIKE ? OR short_name LIKE ? OR long_name LIKE ?
-        """,
-        (search_pattern, search_pattern, search_pattern),
-      )
-      total: int = cur.fetchone()["count"]
-
-      cur.execute(
-        """
-        SELECT node_id, short_name, long_name, hardware, role,
-               first_seen, last_seen, battery_level, voltage,
-               snr, rssi, latitude, longitude, altitude
-        FROM nodes
-        WHERE node_id LIKE ? OR short_name LIKE ? OR long_name LIKE ?
-        ORDER BY last_seen DESC
-        LIMIT ? OFFSET ?
-        """,
-        (search_pattern, search_pattern, search_pattern, limit, offset),
-      )
-
-    else:
-      cur.execute("SELECT COUNT(*) AS count FROM nodes")
-      total = cur.fetchone()["count"]
-
-      cur.execute(
-        """
-        SELECT node_id, short_name, long_name, hardware, role,
-               first_seen, last_seen, battery_level, voltage,
-               snr, rssi, latitude, longitude, altitude
-        FROM nodes
-        ORDER BY last_seen DESC
-        LIMIT ? OFFSET ?
-        """,
-        (limit, offset),
-      )
-
-    rows: list[dict[str, Any]] = [dict(row) for row in cur.fetchall()]
-  finally:
-    conn.close()
+  cur = conn.cursor()
+
+  # Build WHERE clause parts
+  where_parts: list[str] = []
+  params: list[Any] = []
+
+  if search and len(search) >= FTS_MIN_SEARCH_LENGTH:
+    # Quoted as a single phrase so the trigram index matches it as a literal substring
+    match_query: str = '"' + search.replace('"', '""') + '"'
+    where_parts.append("rowid IN (SELECT rowid FROM nodes_fts WHERE nodes_fts MATCH ?)")
+    params.append(match_query)
+
+    cur.execute(
+      "SELECT COUNT(*) AS count FROM nodes_fts WHERE nodes_fts MATCH ?",
+      (match_query,),
+    )
+    total: int = cur.fetchone()["count"]
+
+  elif search:
+    # Too short for a trigram lookup; fall back to a LIKE scan
+    search_pattern: str = f"%{search}%"
+    where_parts.append("(node_id LIKE ? OR short_name LIKE ? OR long_name LIKE ?)")
+    params.extend([search_pattern, search_pattern, search_pattern])
+
+    cur.execute(f"SELECT COUNT(*) AS count FROM nodes WHERE {where_parts[0]}", params)
+    total = cur.fetchone()["count"]
+
+  else:
+    total = get_counts(conn, "nodes")["nodes"]
+
+  if use_cursor:
+    # Row-value comparison lets SQLite seek idx_nodes_last_seen instead of scanning it
+    where_parts.append("(last_seen, node_id) < (?, ?)")
+    params.extend([after_last_seen, after_node_id])
+
+  where_clause = (" WHERE " + " AND ".join(where_parts)) if where_parts else ""
+
+  cur.execute(
+    f"""
+    SELECT node_id, short_name, long_name, hardware, role,
+           first_seen, last_seen, battery_level, voltage,
+           snr, rssi, latitude, longitude, altitude
+    FROM nodes
+    {where_clause}
+    ORDER BY last_seen DESC, node_id DESC
+    LIMIT ? OFFSET ?
+    """,
+    params + [limit, offset],
+  )
+
+  rows: list[dict[str, Any]] = fetch_dicts(cur)
+
+  # Cursor for the next page, or None once a short page shows there are no more
+  next_cursor: Optional[dict[str, Any]] = None
+  if rows and len(rows) == limit:
+    next_cursor = {
+      "after_last_seen": rows[-1]["last_seen"],
+      "after_node_id": rows[-1]["node_id"],
+    }
 
   payload: dict[str, Any] = {
     "meta": {
       "limit": limit,
       "offset": offset,
+      "mode": "cursor" if use_cursor else "offset",
       "total": total,
       "search": search,
+      "next_cursor": next_cursor,
     },
     "nodes": rows,
   }
 
-  return Response(
-    json.dumps(payload, indent=2),
-    mimetype="application/json",
-  )
+  return json_response(payload)
 
 
 @api_bp.route("/nodes/<node_id>", methods=["GET"])
 def get_node(node_id: str) -> Response:
 
   conn = get_db_connection()
-  try:
-    cur = conn.cursor()
-
-    cur.execute(
-      """
-      SELECT node_id, short_name, long_name, hardware, role,
-             first_seen, last_seen, battery_level, voltage,
-             snr, rssi, latitude, longitude, altitude
-      FROM nodes
-      WHERE node_id = ?
-      """,
-      (node_id,),
-    )
+  cur = conn.cursor()
+
+  cur.execute(
+    """
+    SELECT node_id, short_name, long_name, hardware, role,
+           first_seen, last_seen, battery_level, voltage,
+           snr, rssi, latitude, longitude, altitude
+    FROM nodes
+    WHERE node_id = ?
+    """,
+    (node_id,),
+  )
 
-    row: Optional[dict[str, Any]] = cur.fetchone()
-  finally:
-    conn.close()
+  row: Optional[dict[str, Any]] = cur.fetchone()
 
   if row is None:
-    return Response(
-      json.dumps({"error": "Node not found"}),
-      status=404,
-      mimetype="application/json",
-    )
+    return json_response({"error": "Node not found"}, status=404)
 
-  return Response(
-    json.dumps(dict(row), indent=2),
-    mimetype="application/json",
-  )
+  return json_response(dict(row))
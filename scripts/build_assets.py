@@ -7,6 +7,7 @@ This script:
 - Generates content-hashed filenames (rxonly-<HASH>.min.{css,js})
 - Stores the active asset paths in the application meta table
 - Removes previous hashed builds
+- Skips minification when the sources match the stored build
 
 Used during development to ensure cache busting and a single 
 authoritative asset version.
@@ -19,6 +20,7 @@ import hashlib
 import logging
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import rcssmin
@@ -46,14 +48,20 @@ JS_SOURCES = [
 CSS_META_KEY = "css_filename"
 JS_META_KEY = "js_filename"
 
+# Hash of the sources each stored asset was built from
+CSS_SOURCE_META_KEY = "css_source_hash"
+JS_SOURCE_META_KEY = "js_source_hash"
+
+META_KEYS = (CSS_META_KEY, CSS_SOURCE_META_KEY, JS_META_KEY, JS_SOURCE_META_KEY)
+
 LOG_FORMAT = "[%(levelname)s] %(message)s"
 
 
 
 
-def content_hash(data: str) -> str:
-  """Return a short uppercase hash of the given string content."""
-  return hashlib.sha256(data.encode("utf-8")).hexdigest()[:8].upper()
+def content_hash(data: bytes) -> str:
+  """Return a short uppercase hash of the given content."""
+  return hashlib.sha256(data).hexdigest()[:8].upper()
 
 
 
@@ -70,44 +78,64 @@ def cleanup_old(directory: Path, prefix: str, suffix: str, keep: str) -> None:
 
 
 
-def build_css(storage: Storage) -> str:
-  """Minify CSS source and store the hashed filename in meta."""
-  source = CSS_SOURCE.read_text(encoding="utf-8")
+def current_build(stored: dict[str, str | None], meta_key: str, source_meta_key: str, source_hash: str) -> str | None:
+  """Return the stored asset filename if it was built from these sources and still exists."""
+  asset_path = stored.get(meta_key)
+  if not asset_path or stored.get(source_meta_key) != source_hash:
+    return None
+  if not (STATIC_DIR / asset_path).is_file():
+    return None
+  return Path(asset_path).name
+
+
+
+
+def build_css(stored: dict[str, str | None]) -> tuple[str, dict[str, str]]:
+  """Minify CSS source; return the hashed filename and the meta values to store."""
+  # Minify and hash as bytes; no decode/encode round-trip through str
+  source = CSS_SOURCE.read_bytes()
+  source_hash = content_hash(source)
+
+  existing = current_build(stored, CSS_META_KEY, CSS_SOURCE_META_KEY, source_hash)
+  if existing:
+    logging.info("Unchanged %s", existing)
+    return existing, {}
+
   minified = rcssmin.cssmin(source)
 
   hashed = content_hash(minified)
   filename = f"rxonly-{hashed}.min.css"
   out_path = CSS_DIR / filename
 
-  out_path.write_text(minified, encoding="utf-8")
-  storage.set_meta(CSS_META_KEY, f"css/{filename}")
-  cleanup_old(CSS_DIR, "rxonly-", ".min.css", filename)
+  out_path.write_bytes(minified)
 
   logging.info("Built %s", filename)
-  return filename
+  return filename, {CSS_META_KEY: f"css/{filename}", CSS_SOURCE_META_KEY: source_hash}
+
 
 
 
+def build_js(stored: dict[str, str | None]) -> tuple[str, dict[str, str]]:
+  """Concatenate JS sources in load order, minify; return the hashed filename and meta values."""
+  # Joined as raw bytes, so there is no per-file str copy to hold alongside the result
+  combined = b"\n".join(src.read_bytes() for src in JS_SOURCES)
+  source_hash = content_hash(combined)
 
-def build_js(storage: Storage) -> str:
-  """Concatenate JS sources in load order, minify, and store the hashed filename in meta."""
-  parts = []
-  for src in JS_SOURCES:
-    parts.append(src.read_text(encoding="utf-8"))
+  existing = current_build(stored, JS_META_KEY, JS_SOURCE_META_KEY, source_hash)
+  if existing:
+    logging.info("Unchanged %s", existing)
+    return existing, {}
 
-  combined = "\n".join(parts)
   minified = rjsmin.jsmin(combined)
 
   hashed = content_hash(minified)
   filename = f"rxonly-{hashed}.min.js"
   out_path = JS_DIR / filename
 
-  out_path.write_text(minified, encoding="utf-8")
-  storage.set_meta(JS_META_KEY, f"js/{filename}")
-  cleanup_old(JS_DIR, "rxonly-", ".min.js", filename)
+  out_path.write_bytes(minified)
 
   logging.info("Built %s", filename)
-  return filename
+  return filename, {JS_META_KEY: f"js/{filename}", JS_SOURCE_META_KEY: source_hash}
 
 
 
@@ -121,8 +149,22 @@ def main() -> None:
   storage = Storage()
 
   try:
-    build_css(storage)
-    build_js(storage)
+    stored = {key: storage.get_meta(key) for key in META_KEYS}
+
+    # CSS and JS builds are independent; the workers only touch files, so the
+    # Storage connection stays on this thread for the reads above and writes below
+    with ThreadPoolExecutor(max_workers=2) as pool:
+      css_build = pool.submit(build_css, stored)
+      js_build = pool.submit(build_js, stored)
+      css_filename, css_meta = css_build.result()
+      js_filename, js_meta = js_build.result()
+
+    for key, value in {**css_meta, **js_meta}.items():
+      storage.set_meta(key, value)
+
+    # Remove old builds only once meta points at the new ones
+    cleanup_old(CSS_DIR, "rxonly-", ".min.css", css_filename)
+    cleanup_old(JS_DIR, "rxonly-", ".min.js", js_filename)
   finally:
     storage.close()
 